@@ -6,6 +6,7 @@ Stores a BNF grammar in the BNF class.
 Used by the grmr file reader to read a file and then convert it
 to CNF, for use in the PhraseStructure class.
 """
+from collections import Counter
 from .phrase_structure import PhraseStructure
 
 class BNF_Symbol:
@@ -29,6 +30,8 @@ class BNF_Symbol:
     - symbol(any): The symbol with which this class is referred to in the handler
     - rules(set(tuple(any)))
     - parents(set(any))
+    - child_counts(Counter): Number of times each symbol occurs
+                            in the rules of this symbol
     - is_terminal(bool): Determines whether the symbol can produce other
                          symbols (whether it can have rules)
     """
@@ -49,6 +52,7 @@ class BNF_Symbol:
         self.symbol = symbol
         self.rules = set()
         self.parents = set()
+        self.child_counts = Counter()
         self.is_terminal = is_terminal
 
 
@@ -68,7 +72,9 @@ class BNF_Symbol:
         """
         if self.is_terminal:
             return -1
-        self.rules.add(produces)
+        if produces not in self.rules:
+            self.rules.add(produces)
+            self.child_counts.update(produces)
         return 0
 
 
@@ -88,9 +94,10 @@ class BNF_Symbol:
                     under this symbol
                   0 otherwise
         """
-        if tuple(produces) not in self.rules:
+        if produces not in self.rules:
             return -1
-        self.rules.remove(tuple(produces))
+        self.rules.remove(produces)
+        self.child_counts.subtract(produces)
         return 0
 
 
@@ -171,11 +178,21 @@ class BNF:
     - add_terminal_symbol(self, symbol)
     - add_intermediate_symbol(self, symbol)
     - add_rule(self, input_symbol, output_symbols)
-    - conversion_start(self)
+    - conversion_start(self): START step, applied once by convert_to_cnf.
+    - conversion_pass(self): Applies TERM, BIN and UNIT to every rule in
+                             a single walk. Repeated by convert_to_cnf
+                             until the grammar stops changing.
+    - conversion_term_product_determinalizer(self, parent_symbol, rule, is_term),
+      conversion_bin_rule(self, parent_symbol, rule),
+      conversion_unit_rule(self, parent_symbol, product, is_term):
+                             Apply TERM, BIN and UNIT to a single rule.
     - conversion_term(self)
     - conversion_bin(self)
     - conversion_del(self)
     - conversion_unit(self)
+                             Each apply a single step to the whole grammar.
+                             convert_to_cnf does not use them; they are kept
+                             only as standalone entry points.
     - check_if_cnf(self)
     - convert_to_cnf(self)
 
@@ -196,6 +213,8 @@ class BNF:
                                          convert_to_cnf that implements
                                          bin and term intermediate
                                          symbol replacement
+        - term_replacements(dict): Maps terminals to the intermediate
+                                   symbol which replaces them in TERM
         - tags(dict): Assigns symbol references in this class
                       to the symbol references to be outputted
                       in the PhraseStructure instance
@@ -204,6 +223,7 @@ class BNF:
         self.start_symbol = 0
         self.symbols = {0: BNF_Symbol(0, is_terminal=False)}
         self.current_term_replacement = -1
+        self.term_replacements = {}
         self.tags = {}
 
 
@@ -220,7 +240,7 @@ class BNF:
             None
         """
         self.symbols[self.start_symbol].add_rule(*rule)
-        for item in rule:
+        for item in set(rule):
             self.symbols[item].add_parent(self.start_symbol)
 
 
@@ -305,17 +325,27 @@ class BNF:
             if symbol not in self.symbols:
                 return -2
         self.symbols[input_symbol].add_rule(*output_symbols_tuple)
-        for symbol in output_symbols_tuple:
+        for symbol in set(output_symbols_tuple):
             self.symbols[symbol].add_parent(input_symbol)
         return 0
 
 
     def does_start_occur_on_right(self):
-        for symbol in self.symbols:
-            for rule in self.symbols[symbol].get_rules():
-                if self.start_symbol in rule:
-                    return True
-        return False
+        """
+        does_start_occur_on_right
+
+        Helper method to conversion_start.
+        Checks if the start symbol is produced by any rule, using
+        the parents stored under the start symbol.
+
+        Parameters:
+            None
+
+        Returns:
+            bool: True if the start symbol occurs on the right-hand side
+                  of a rule, False otherwise.
+        """
+        return bool(self.symbols[self.start_symbol].get_parents())
 
 
     def conversion_start(self):
@@ -330,12 +360,14 @@ class BNF:
             None
 
         Returns:
-            None
+            bool: True if the grammar was changed, False otherwise.
         """
-        if self.does_start_occur_on_right():
-            self.start_symbol = self.start_symbol+1
-            self.add_intermediate_symbol(self.start_symbol)
-            self.add_rule(self.start_symbol, (self.start_symbol-1,))
+        if not self.does_start_occur_on_right():
+            return False
+        self.start_symbol = self.start_symbol+1
+        self.add_intermediate_symbol(self.start_symbol)
+        self.add_rule(self.start_symbol, (self.start_symbol-1,))
+        return True
 
 
     def conversion_term_replacer(self, terminal_product):
@@ -346,7 +378,8 @@ class BNF:
         Replaces terminal_product with new element which
         is intermediate, so that a rule does not lead
         to more than one product including terminals,
-        which would violate CNF.
+        which would violate CNF. The same intermediate is
+        reused for every occurence of terminal_product.
 
         Parameters:
         - terminal_product(any): The symbol reference to be
@@ -357,47 +390,67 @@ class BNF:
             int: replacement_id of new intermediate which directs
                  to the terminal being removed.
         """
+        if terminal_product in self.term_replacements:
+            return self.term_replacements[terminal_product]
         replacement_id = self.current_term_replacement
         self.current_term_replacement -= 1
         self.symbols[replacement_id] = BNF_Symbol(replacement_id, is_terminal=False)
         self.symbols[replacement_id].add_rule(terminal_product)
         self.symbols[terminal_product].add_parent(replacement_id)
+        self.term_replacements[terminal_product] = replacement_id
         return replacement_id
 
 
-    def check_if_conversion_term_necessary(self, rule):
-        has_nonterminals = False
-        has_terminals = False
+    def check_if_conversion_term_necessary(self, rule, is_term):
+        """
+        check_if_conversion_term_necessary
+
+        Helper method to conversion_term.
+        Checks if a rule has more than one product and at least
+        one of them is terminal.
+
+        Parameters:
+        - rule(tuple(any)): The rule being checked.
+        - is_term(dict): Maps symbol references to their is_terminal value.
+
+        Returns:
+            bool: Whether TERM has to be applied to the rule.
+        """
+        if len(rule) < 2:
+            return False
         for item in rule:
-            if self.symbols[item].is_terminal:
-                has_terminals = True
-            else:
-                has_nonterminals = True
-        return has_nonterminals and has_terminals
+            if is_term[item]:
+                return True
+        return False
 
 
-    def conversion_term_product_determinalizer(self, parent_symbol, rule):
+    def conversion_term_product_determinalizer(self, parent_symbol, rule, is_term):
         """
         conversion_term_product_determinalizer
 
         conversion_term helper method.
         Calls conversion_term_replacer to replace terminals in rules
-        with intermediate rule.
+        with intermediate rule, and swaps the rule for the rewritten one
+        so that TERM is finished in a single pass.
 
         Parameters:
         - parent_symbol(any): The parent symbol of the rule being determinalized.
         - rule(tuple(any)): The rule under the parent symbol beign determinalized.
+        - is_term(dict): Maps symbol references to their is_terminal value.
 
         Returns:
-            None
-        """
-        replaced = False
+            tuple(any): The rewritten rule which replaced rule.
+        """
+        new_rule = tuple(
+            self.conversion_term_replacer(item) if is_term[item] else item
+            for item in rule
+        )
+        self.symbols[parent_symbol].remove_rule(*rule)
+        self.add_rule(parent_symbol, new_rule)
         for item in rule:
-            if self.symbols[item].is_terminal:
-                replaced = True
-                self.conversion_term_replacer(item)
-        if replaced:
-            self.symbols[parent_symbol].remove_rule(rule)
+            if self.is_only_subrule_with_daughter(parent_symbol, item):
+                self.symbols[item].remove_parent(parent_symbol)
+        return new_rule
 
 
     def conversion_term(self):
@@ -411,14 +464,18 @@ class BNF:
             None
 
         Returns:
-            None
+            bool: True if the grammar was changed, False otherwise.
         """
-        old_symbols = set(self.symbols.keys()).copy()
+        changed = False
+        is_term = {symbol: self.symbols[symbol].is_terminal for symbol in self.symbols}
+        old_symbols = tuple(self.symbols)
         for symbol in old_symbols:
-            old_rules = set(self.symbols[symbol].get_rules()).copy()
+            old_rules = tuple(self.symbols[symbol].get_rules())
             for rule in old_rules:
-                if self.check_if_conversion_term_necessary(rule):
-                    self.conversion_term_product_determinalizer(symbol, rule)
+                if self.check_if_conversion_term_necessary(rule, is_term):
+                    self.conversion_term_product_determinalizer(symbol, rule, is_term)
+                    changed = True
+        return changed
 
 
     def conversion_bin_splitter(self, parent_symbol, rule):
@@ -435,21 +492,21 @@ class BNF:
                             splitting.
 
         Returns:
-            set(tuple(any)): The set of 2-tuples of new rules for the given
-                             rule argument.
+            list(tuple(any)): The (parent, symbol1, symbol2) 3-tuples of new
+                              rules for the given rule argument, in order.
         """
-        replacements = set()
+        replacements = []
         previous_replacement_id = parent_symbol
         replacement_id = self.current_term_replacement
         self.current_term_replacement -= 1
         # self.add_symbol(replacement_id, is_terminal=False)
         for item in rule[:-2]:
             self.add_symbol(replacement_id, is_terminal = False)
-            replacements.add((previous_replacement_id, item, replacement_id))
+            replacements.append((previous_replacement_id, item, replacement_id))
             previous_replacement_id = replacement_id
             replacement_id = self.current_term_replacement
             self.current_term_replacement -= 1
-        replacements.add((previous_replacement_id, rule[-2], rule[-1]))
+        replacements.append((previous_replacement_id, rule[-2], rule[-1]))
         return replacements
 
 
@@ -475,6 +532,31 @@ class BNF:
         return len(rule)>2#nonterminals > 2
 
 
+    def conversion_bin_rule(self, parent_symbol, rule):
+        """
+        conversion_bin_rule
+
+        Helper method to conversion_bin.
+        Replaces a single long rule with the chain of 2-item rules
+        given by conversion_bin_splitter.
+
+        Parameters:
+        - parent_symbol(any): The parent symbol reference of the rule.
+        - rule(tuple(any)): The rule being split.
+
+        Returns:
+            None
+        """
+        for parent, symbol1, symbol2 in self.conversion_bin_splitter(parent_symbol, rule):
+            self.symbols[parent].add_rule(symbol1, symbol2)
+            self.symbols[symbol1].add_parent(parent)
+            self.symbols[symbol2].add_parent(parent)
+        self.symbols[parent_symbol].remove_rule(*rule)
+        for item in rule:
+            if self.is_only_subrule_with_daughter(parent_symbol, item):
+                self.symbols[item].remove_parent(parent_symbol)
+
+
     def conversion_bin(self):
         """
         converison_bin
@@ -486,35 +568,31 @@ class BNF:
             None
 
         Returns:
-            None
+            bool: True if the grammar was changed, False otherwise.
         """
-        oldsymbols = set(self.symbols.keys()).copy()
-        for symbol in oldsymbols:
-            oldrules = self.symbols[symbol].get_rules().copy()
-            for rule in oldrules:
+        changed = False
+        old_symbols = tuple(self.symbols)
+        for symbol in old_symbols:
+            old_rules = tuple(self.symbols[symbol].get_rules())
+            for rule in old_rules:
                 if self.is_bin_applicable(rule):
-                    replacements = self.conversion_bin_splitter(symbol, rule)
-                    for parent, symbol1, symbol2 in replacements:
-                        self.symbols[parent].add_rule(symbol1, symbol2)
-                        self.symbols[symbol1].add_parent(parent)
-                        self.symbols[symbol2].add_parent(parent)
-                    self.symbols[symbol].remove_rule(*rule)
-                    for item in rule:
-                        if self.is_only_subrule_with_daughter(symbol, item):
-                            self.symbols[item].remove_parent(symbol)
+                    self.conversion_bin_rule(symbol, rule)
+                    changed = True
+        return changed
 
     def conversion_del(self):
         #We don't accept epsilon-rules in this current scheme,
         # making this function irrelevant for the time being...
-        pass
+        return False
 
     def is_only_subrule_with_daughter(self, parent_symbol, daughter_symbol):
         """
         is_only_subrule_with_daughter
 
-        Helper method to conversion_unit.
-        Checks if a given daughter symbol only occurs once within ruleset
-        of parent symbol.
+        Helper method to the TERM, BIN and UNIT rule rewrites.
+        Checks if a given daughter symbol no longer occurs within the
+        ruleset of parent symbol, using the parent's child_counts, so
+        the parent link can be removed after a rule is removed.
 
         Parameters:
         - parent_symbol(any): The parent symbol under which the daughter
@@ -523,13 +601,43 @@ class BNF:
                                 are being measured by this function.
 
         Returns:
-            bool: Whether rules contain daughter only once.
+            bool: Whether rules no longer contain daughter.
+        """
+        return not self.symbols[parent_symbol].child_counts[daughter_symbol]
+
+
+    def conversion_unit_rule(self, parent_symbol, product, is_term):
+        """
+        conversion_unit_rule
+
+        Helper method to conversion_unit.
+        Removes the unit rule (product,) from parent_symbol, and gives
+        parent_symbol every non-unit rule of the symbols reachable from
+        product through unit rules. Only non-unit rules are copied, so
+        cycles of unit rules cannot bring the removed rule back.
+
+        Parameters:
+        - parent_symbol(any): The symbol holding the unit rule.
+        - product(any): The nonterminal produced by the unit rule.
+        - is_term(dict): Maps symbol references to their is_terminal value.
+
+        Returns:
+            None
         """
-        is_only_subrule_with_daughter = True
-        for rule in self.symbols[parent_symbol].get_rules():
-            if daughter_symbol in rule and len(rule) > 1:
-                is_only_subrule_with_daughter = False
-        return is_only_subrule_with_daughter
+        reached = {product}
+        pending = [product]
+        while pending:
+            symbol = pending.pop()
+            for rule in tuple(self.symbols[symbol].get_rules()):
+                if len(rule) == 1 and not is_term[rule[0]]:
+                    if rule[0] not in reached:
+                        reached.add(rule[0])
+                        pending.append(rule[0])
+                else:
+                    self.add_rule(parent_symbol, rule)
+        self.symbols[parent_symbol].remove_rule(product)
+        if self.is_only_subrule_with_daughter(parent_symbol, product):
+            self.symbols[product].remove_parent(parent_symbol)
 
 
     def conversion_unit(self):
@@ -543,21 +651,59 @@ class BNF:
             None
 
         Returns:
-            None
+            bool: True if the grammar was changed, False otherwise.
         """
-        unit_rule_products = set()
-        old_symbols = set(self.symbols.keys()).copy()
+        changed = False
+        is_term = {symbol: self.symbols[symbol].is_terminal for symbol in self.symbols}
+        old_symbols = tuple(self.symbols)
         for symbol in old_symbols:
-            old_rules = set(self.symbols[symbol].get_rules()).copy()
+            old_rules = tuple(self.symbols[symbol].get_rules())
             for rule in old_rules:
-                if len(rule) == 1 and self.symbols[rule[0]].is_terminal is False:
-                    unit_rule_products.add((symbol, rule[0]))
-                    for subrule in self.symbols[rule[0]].get_rules():
-                        self.symbols[symbol].add_rule(*subrule)
-        for parent, product in unit_rule_products:
-            self.symbols[parent].remove_rule(product)
-            if self.is_only_subrule_with_daughter(parent, product):
-                self.symbols[product].remove_parent(parent)
+                if len(rule) == 1 and not is_term[rule[0]]:
+                    self.conversion_unit_rule(symbol, rule[0], is_term)
+                    changed = True
+        return changed
+
+
+    def conversion_pass(self):
+        """
+        conversion_pass
+
+        Applies the TERM, BIN and UNIT steps of the BNF->CNF conversion
+        in a single walk over the rules, rewriting each rule with the
+        helper methods of those steps as it is reached. Unit rules are
+        collected and rewritten after the walk, once every rule they
+        copy has been through TERM and BIN, so that a long rule is split
+        once rather than once per unit parent. Rules added during the
+        pass are left for the next pass.
+
+        Parameters:
+            None
+
+        Returns:
+            bool: True if the grammar was changed, False otherwise.
+        """
+        changed = False
+        is_term = {symbol: self.symbols[symbol].is_terminal for symbol in self.symbols}
+        unit_rules = []
+        old_symbols = tuple(self.symbols)
+        for symbol in old_symbols:
+            rules = self.symbols[symbol].get_rules()
+            for rule in tuple(rules):
+                if len(rule) == 1:
+                    if not is_term[rule[0]]:
+                        unit_rules.append((symbol, rule[0]))
+                    continue
+                if self.check_if_conversion_term_necessary(rule, is_term):
+                    rule = self.conversion_term_product_determinalizer(symbol, rule, is_term)
+                    changed = True
+                if self.is_bin_applicable(rule):
+                    self.conversion_bin_rule(symbol, rule)
+                    changed = True
+        for symbol, product in unit_rules:
+            self.conversion_unit_rule(symbol, product, is_term)
+            changed = True
+        return changed
 
 
     def check_if_cnf(self):
@@ -565,9 +711,9 @@ class BNF:
         check_if_cnf
 
         Checks if grammar stored in BNF class instance has been
-        converted into CNF yet. Used in convert_to_cnf method
-        to determine if CNF has been reached yet by optimal order
-        of grammar transformations (START, TERM, BIN, DEL, UNIT)
+        converted into CNF yet. convert_to_cnf stops once a pass of
+        grammar transformations (TERM, BIN, UNIT) makes no changes,
+        so this is not needed during conversion.
 
         Parameters:
             None
@@ -575,17 +721,18 @@ class BNF:
         Returns:
             bool: True if CNF, False if not CNF.
         """
+        is_term = {symbol: self.symbols[symbol].is_terminal for symbol in self.symbols}
         for symbol in self.symbols:
             for rule in self.symbols[symbol].get_rules():
                 if len(rule) > 2:
                     return False
                 elif len(rule) == 2:
-                    if self.symbols[rule[0]].is_terminal:
+                    if is_term[rule[0]]:
                         return False
-                    if self.symbols[rule[1]].is_terminal:
+                    if is_term[rule[1]]:
                         return False
                 elif len(rule) == 1:
-                    if not self.symbols[rule[0]].is_terminal:
+                    if not is_term[rule[0]]:
                         return False
         return True
 
@@ -634,12 +781,15 @@ class BNF:
         Returns:
             None
         """
+        used_tags = set(self.tags.values())
         tag = 0
         for symbol in self.symbols:
             if symbol not in self.tags:
-                while tag in self.tags.values():
+                while tag in used_tags:
                     tag += 1
                 self.tags[symbol] = tag
+                used_tags.add(tag)
+                tag += 1
         self.reset_start_symbol_for_cnf()
 
 
@@ -682,17 +832,17 @@ class BNF:
         Converts this BNF instance to a CNF compatible form and
         returns a PhraseStructure instance of this grammar to
         be used for sentence generation and CYK tree identification.
+        START is applied once, then conversion passes are repeated
+        until one of them leaves the grammar unchanged. DEL is not
+        needed, as epsilon-rules are not accepted.
 
         Parameters:
             None
 
         Returns:
-            None
+            PhraseStructure: The CNF grammar (see create_phrase_structure).
         """
-        while not self.check_if_cnf():
-            self.conversion_start()
-            self.conversion_term()
-            self.conversion_bin()
-            self.conversion_del()
-            self.conversion_unit()
+        self.conversion_start()
+        while self.conversion_pass():
+            pass
         return self.create_phrase_structure()
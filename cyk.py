@@ -7,35 +7,239 @@ list of symbols is within a given PhraseStructure class's grammar.
 from .phrase_structure import PhraseStructure
 
 
+def _row_start(stride, row):
+    """
+    _row_start
+
+    Gets the index of the first cell of a row in a flat CYK table.
+    Only the triangle of cells with row+column < stride is stored,
+    so row r holds stride-r cells.
+
+    Parameters:
+    - stride(int): The number of cells in row 0 of the table.
+    - row(int): The row index.
+
+    Returns:
+        int: The index in the table of the cell at (row, 0).
+    """
+    return row*stride - row*(row-1)//2
+
+
+def _fill_row(table, stride, size, row, left_cells, rule_index, right_masks, left_mask, right_mask,
+              product_cache, symbol_ids=None, span_cache=None):
+    """
+    _fill_row
+
+    Fills a row of a CYK table of bitsets. Kept as a free function
+    with bit iteration written out inline, since this is the hot loop
+    of the CYK algorithm and avoids attribute and generator overhead.
+
+    Each split point combines a left and a right cell. The parents
+    produced by a pair of cells only depend on the grammar, and most
+    grammars only give rise to a small number of distinct cells, so
+    the result is cached in product_cache. A cached pair costs a single
+    lookup instead of a loop over the symbols of both cells.
+
+    Most cells of the table are empty for typical grammars, so only
+    the split points whose left cell is in left_cells are visited,
+    rather than every split point of the cell.
+
+    Parameters:
+    - table(list(int)): The flat CYK table, with rows below row filled.
+                        The cell at (row, column) is
+                        table[_row_start(stride, row)+column].
+    - stride(int): The number of cells in row 0 of table.
+    - size(int): The length of the symbol list being evaluated.
+    - row(int): The row index to be filled.
+    - left_cells(list(list(tuple(int)))): For each column, the (row, bitset)
+                                          of every filled cell in that column
+                                          holding a left daughter, with the
+                                          bitset masked by left_mask. Cells
+                                          of this row are appended to it.
+    - rule_index(list(dict)): See CYK.rule_index.
+    - right_masks(list(int)): See CYK.right_masks.
+    - left_mask(int): See CYK.left_mask.
+    - right_mask(int): See CYK.right_mask.
+    - product_cache(dict): See CYK.product_cache.
+    - symbol_ids(list(int)): The ids of the symbols being evaluated
+                             (see CYK.tokenize). Only needed when
+                             span_cache is given.
+    - span_cache(dict): Optional. Maps spans of symbol ids to the cell
+                        computed for them, and is read before and
+                        written after computing each cell.
+
+    Returns:
+        None
+    """
+    row_starts = [_row_start(stride, split) for split in range(row+1)]
+    row_start = row_starts[row]
+    for column in range(size-row):
+        if span_cache is not None:
+            span = tuple(symbol_ids[column:column+row+1])
+            cell = span_cache.get(span)
+            if cell is not None:
+                table[row_start+column] = cell
+                if cell & left_mask:
+                    left_cells[column].append((row, cell & left_mask))
+                continue
+        cell = 0
+        for left_i, left in left_cells[column]:
+            right = table[row_starts[row-left_i-1]+column+left_i+1] & right_mask
+            if not right:
+                continue
+            pair = (left, right)
+            parents = product_cache.get(pair)
+            if parents is None:
+                parents = 0
+                while left:
+                    low_bit = left & -left
+                    left ^= low_bit
+                    left_id = low_bit.bit_length() - 1
+                    products = rule_index[left_id]
+                    right_ids = right & right_masks[left_id]
+                    while right_ids:
+                        low_bit = right_ids & -right_ids
+                        right_ids ^= low_bit
+                        parents |= products[low_bit.bit_length() - 1]
+                product_cache[pair] = parents
+            cell |= parents
+        table[row_start+column] = cell
+        if cell & left_mask:
+            left_cells[column].append((row, cell & left_mask))
+        if span_cache is not None:
+            span_cache[span] = cell
+
+
+def _get_left_cells(table, stride, size, rows, left_mask):
+    """
+    _get_left_cells
+
+    Builds the left_cells argument of _fill_row from filled rows.
+
+    Parameters:
+    - table(list(int)): The flat CYK table.
+    - stride(int): See _fill_row.
+    - size(int): See _fill_row.
+    - rows(int): The number of filled rows to collect cells from.
+    - left_mask(int): See CYK.left_mask.
+
+    Returns:
+        list(list(tuple(int))): See _fill_row.
+    """
+    left_cells = [[] for _ in range(size)]
+    for row in range(rows):
+        row_start = _row_start(stride, row)
+        for column in range(size-row):
+            left = table[row_start+column] & left_mask
+            if left:
+                left_cells[column].append((row, left))
+    return left_cells
+
+
+def _fill_table(table, stride, size, rule_index, right_masks, left_mask, right_mask,
+                product_cache, symbol_ids=None, span_cache=None):
+    """
+    _fill_table
+
+    Fills every row above row 0 of a CYK table of bitsets.
+
+    Parameters:
+    - table(list(int)): The flat CYK table, with row 0 filled.
+    - stride(int): See _fill_row.
+    - size(int): See _fill_row.
+    - rule_index(list(dict)): See CYK.rule_index.
+    - right_masks(list(int)): See CYK.right_masks.
+    - left_mask(int): See CYK.left_mask.
+    - right_mask(int): See CYK.right_mask.
+    - product_cache(dict): See CYK.product_cache.
+    - symbol_ids(list(int)): See _fill_row.
+    - span_cache(dict): See _fill_row.
+
+    Returns:
+        None
+    """
+    left_cells = _get_left_cells(table, stride, size, 1, left_mask)
+    for row in range(1, size):
+        _fill_row(table, stride, size, row, left_cells, rule_index, right_masks, left_mask, right_mask,
+                  product_cache, symbol_ids, span_cache)
+
+
 class CYK:
     """
     CYK:
 
     A class for determining if a list of symbols is grammatical.
 
+    Each cell of the CYK table is stored as a bitset (a python int),
+    where bit n is set when the symbol with id n can produce the
+    span covered by the cell.
+
+    The parents produced by each distinct pair of cells seen while
+    parsing are cached in product_cache, so memory grows with the
+    number of distinct cell pairs. The cache is cleared before a call
+    once it holds more than product_cache_limit entries. When memoize
+    is enabled, span_cache is bounded by span_cache_limit in the same way.
+
     Functions:
-    - __init__(self, phrase_structure): Initializes cyk by linking it
-                                        to a pre-existing grammar.
+    - __init__(self, phrase_structure, memoize=False, product_cache_limit=65536,
+               span_cache_limit=65536):
+                Initializes cyk by linking it to a pre-existing grammar.
     - fits_grammar(self, symbol_list): Checks whether a symbol list
                                        follows the grammar specified
                                        in the phrase structure class
                                        provided.
-    - get_previous_tree(self): Returns the possible trees for the
-                               previous call to fits_grammar.
-                               Returns a list of length zero when
-                               the previous fits_grammar call was
-                               False.
+    - get_tree(self, symbol_list): Returns a parse tree of symbol_list,
+                                   or None when symbol_list does not
+                                   fit the grammar.
 
     Variables:
-    - cyk_table(list(list(set))): Stores information used in the CYK algorithm.
+    - cyk_table(list(int)): Stores information used in the CYK algorithm, as a
+                            flat list of cells (see get_cell).
+    - cyk_size(int): The length of the symbol list the table was filled for.
+    - cyk_stride(int): The number of cells in row 0 of cyk_table, which is
+                       the largest size the table has been generated for.
     - phrase_structure(PhraseStructure): Stores the grammar to be evaluated.
+    - span_cache(dict): Maps spans of symbol ids to their cell bitset when
+                        memoize is enabled, None otherwise.
+    - span_cache_limit(int): The number of span_cache entries past which
+                             the cache is cleared before the next call.
+    - symbol_ids(dict): Maps each symbol to its bit index in the cells.
+    - id_symbols(list): Maps each bit index back to its symbol.
+    - parents_by_id(list(int)): The bitset of parents of each symbol id,
+                                used to fill row 0 of the table.
+    - rhs_to_parents(dict): Maps each rule (B, C) to the frozenset of
+                            parents which have that rule.
+    - parent_rules(list(list(tuple(int)))): For each parent id, the
+                                            (B, C) id pairs of its
+                                            two-daughter rules.
+    - rule_index(list(dict)): For each left daughter id B, maps the right
+                              daughter id C to the bitset of parents
+                              which have the rule (B, C).
+    - right_masks(list(int)): For each left daughter id B, the bitset of
+                              right daughters C which B has rules with.
+    - left_mask(int): The bitset of symbols which are left daughters in
+                      any rule.
+    - right_mask(int): The bitset of symbols which are right daughters in
+                       any rule.
+    - product_cache(dict): Maps pairs of (left, right) cell bitsets to
+                           the bitset of parents they produce. Filled
+                           while parsing and kept between calls, as it
+                           only depends on the grammar.
+    - product_cache_limit(int): The number of product_cache entries past
+                                which the cache is cleared before the
+                                next call.
     """
     def generate_cyk_table(self, size):
         """
         generate_cyk_table
 
         Generates the cyk table when called by fits_grammar,
-        stored in self.cyk_table
+        stored in self.cyk_table as a single flat list holding only
+        the triangle of cells with row+column < cyk_stride, row after
+        row. The list is kept between calls and only reallocated when
+        size exceeds the largest size seen so far. Cells are not
+        cleared, since every cell with row+column < size is
+        overwritten when filling.
 
         Parameters:
             size(int): The length of the symbol list being evaluated
@@ -43,69 +247,150 @@ class CYK:
         Returns:
             None
         """
-        self.cyk_table = []
-        for i in range(size):
-            self.cyk_table.append([])
-            for j in range(size-i):
-                self.cyk_table[i].append(set())
+        if size > self.cyk_stride:
+            self.cyk_table = [0] * (size*(size+1)//2)
+            self.cyk_stride = size
+        self.cyk_size = size
 
 
-    def __init__(self, phrase_structure):
+    def get_cell(self, row, column):
+        """
+        get_cell
+
+        Gets a cell of the cyk table.
+
+        Parameters:
+        - row(int): The row of the cell, one less than the length
+                    of the span it covers.
+        - column(int): The column of the cell, the index of the first
+                       symbol of the span it covers.
+
+        Returns:
+            int: The bitset of symbols which produce the span. Only
+                 meaningful for row+column < cyk_size.
+        """
+        return self.cyk_table[_row_start(self.cyk_stride, row)+column]
+
+
+    def __init__(self, phrase_structure, memoize=False, product_cache_limit=65536,
+                 span_cache_limit=65536):
         """
         __init__
 
         Initializes class instance with specified CNF grammar
         stored in PhraseStructure instance provided as an argument.
+        The grammar is indexed here, so it should be complete before
+        the CYK instance is created.
 
         Parameters:
         - phrase_structure(PhraseStructure): The CNF grammar used for
                                              evaluating inputted symbol lists
+        - memoize(bool): Optional. Caches the cell computed for every span
+                         of symbols, so that later calls sharing spans with
+                         earlier ones skip recomputing them. Only worth it
+                         when evaluating many similar symbol lists, as the
+                         cache grows with every new span.
+        - product_cache_limit(int): Optional. Bounds the size of
+                                    product_cache between calls. A single
+                                    call can still add entries past it.
+        - span_cache_limit(int): Optional. Bounds the size of span_cache
+                                 between calls, as product_cache_limit does.
         """
-        self.cyk_table = None
+        self.cyk_table = []
+        self.cyk_size = 0
+        self.cyk_stride = 0
         self.phrase_structure = phrase_structure
+        self.span_cache = {} if memoize else None
+        self.product_cache = {}
+        self.product_cache_limit = product_cache_limit
+        self.span_cache_limit = span_cache_limit
+        self.symbol_ids = {}
+        self.id_symbols = []
+        for symbol in phrase_structure.symbols:
+            self.symbol_ids[symbol] = len(self.id_symbols)
+            self.id_symbols.append(symbol)
+        self.parents_by_id = []
+        for symbol in self.id_symbols:
+            self.parents_by_id.append(self.symbols_to_mask(phrase_structure.symbols[symbol].get_parents()))
+        self.rhs_to_parents = self.generate_rhs_to_parents()
+        self.rule_index = self.generate_rule_index()
+        self.parent_rules = [[] for _ in self.id_symbols]
+        for (left, right), parents in self.rhs_to_parents.items():
+            for parent in parents:
+                self.parent_rules[self.symbol_ids[parent]].append((self.symbol_ids[left], self.symbol_ids[right]))
+        self.right_masks = []
+        self.left_mask = 0
+        self.right_mask = 0
+        for left_id, products in enumerate(self.rule_index):
+            right_mask = 0
+            for right_id in products:
+                right_mask |= 1 << right_id
+            self.right_masks.append(right_mask)
+            self.right_mask |= right_mask
+            if products:
+                self.left_mask |= 1 << left_id
+
+
+    def generate_rhs_to_parents(self):
+        """
+        generate_rhs_to_parents
 
+        Maps each right-hand side (B, C) of a two-daughter rule to
+        the parents which have that rule, so that CYK never has to
+        intersect parent sets or test rule membership per pair.
 
-    def get_cyk_pairs(self, row, column):
+        Parameters:
+            None
+
+        Returns:
+            dict: Maps 2-tuples of symbols to frozensets of parent symbols.
+        """
+        rhs_to_parents = {}
+        for symbol in self.phrase_structure.symbols:
+            for rule in self.phrase_structure.symbols[symbol].get_rules():
+                if len(rule) == 2:
+                    rhs_to_parents.setdefault(rule, set()).add(symbol)
+        for rule, parents in rhs_to_parents.items():
+            rhs_to_parents[rule] = frozenset(parents)
+        return rhs_to_parents
+
+
+    def generate_rule_index(self):
         """
-        get_cyk_pairs
+        generate_rule_index
 
-        For a given row and column entry, finds the relevant pairs
-        to be compared to find a parent rule.
+        Builds the lookup table used by fill_cyk_row from rhs_to_parents,
+        mapping each pair of daughter ids (B, C) to the bitset of parents
+        with the rule (B, C).
 
         Parameters:
-        - row(int): The row of the entry being evaluated
-        - column(int): The column of the entry being evaluated
+            None
 
         Returns:
-            set: Pairs (2-tuples) of symbols to be checked for common parent rule
+            list(dict): Indexed by B, each dict maps C to a parent bitset.
         """
-        pairs = set()
-        for left_i in range(row):
-            left_j = column
-            right_j = column+left_i+1
-            right_i = row-left_i-1
-            for item1 in self.cyk_table[left_i][left_j]:
-                for item2 in self.cyk_table[right_i][right_j]:
-                    pairs.add((item1, item2))
-        return pairs
+        rule_index = [{} for _ in self.id_symbols]
+        for (left, right), parents in self.rhs_to_parents.items():
+            rule_index[self.symbol_ids[left]][self.symbol_ids[right]] = self.symbols_to_mask(parents)
+        return rule_index
 
 
-    def get_common_parents(self, item1, item2):
+    def symbols_to_mask(self, symbols):
         """
-        get_common_parents
+        symbols_to_mask
 
-        Finds the intersection of parents between symbols item1 and item2.
+        Converts a collection of symbols into a cell bitset.
 
         Parameters:
-        - item1(any): symbol of first item to find parents for.
-        - item2(any): symbol of second item to find parents for.
+        - symbols(iterable(any)): The symbols to be set in the bitset.
 
         Returns:
-            set: parent symbols in common between item1 and item2
+            int: The bitset with the bit of each symbol set.
         """
-        parents1 = self.phrase_structure.symbols[item1].get_parents()
-        parents2 = self.phrase_structure.symbols[item2].get_parents()
-        return parents1.intersection(parents2)
+        mask = 0
+        for symbol in symbols:
+            mask |= 1 << self.symbol_ids[symbol]
+        return mask
 
 
     def fill_cyk_row(self, row):
@@ -113,6 +398,9 @@ class CYK:
         fill_cyk_row
 
         Fills a row of the CYK table following CYK algorithm.
+        For every split point, the parents produced by the left and right
+        cells are found in product_cache, or by looking up each pair of
+        their symbols in rule_index, and OR-ed into the cell. See _fill_row.
 
         Parameters:
             row(int): the row index to be filled
@@ -120,13 +408,58 @@ class CYK:
         Returns:
             None
         """
-        width = len(self.cyk_table[row])
-        for column in range(width):
-            pairs = self.get_cyk_pairs(row, column)
-            for item1, item2 in pairs:
-                for parent in self.get_common_parents(item1, item2):
-                    if (item1, item2) in self.phrase_structure.symbols[parent].get_rules():
-                        self.cyk_table[row][column].add(parent)
+        left_cells = _get_left_cells(self.cyk_table, self.cyk_stride, self.cyk_size, row, self.left_mask)
+        _fill_row(self.cyk_table, self.cyk_stride, self.cyk_size, row, left_cells, self.rule_index,
+                  self.right_masks, self.left_mask, self.right_mask, self.product_cache)
+
+
+    def tokenize(self, symbol_list):
+        """
+        tokenize
+
+        Converts a list of symbols to the list of their ids, as used
+        for bit indices in the cyk table.
+
+        Parameters:
+        - symbol_list(list(any)): The list of symbols to be converted.
+
+        Returns:
+            list(int): The id of each symbol in symbol_list.
+        """
+        symbol_ids = self.symbol_ids
+        return [symbol_ids[symbol] for symbol in symbol_list]
+
+
+    def fill_cyk_table(self, symbol_list):
+        """
+        fill_cyk_table
+
+        Generates and fills the CYK table for symbol_list, shared by
+        fits_grammar and get_tree.
+
+        Parameters:
+        - symbol_list(list(any)): The list of symbols to be evaluated.
+
+        Returns:
+            bool: Whether the root symbol (None) produces the whole symbol_list
+        """
+        size = len(symbol_list)
+        self.generate_cyk_table(size)
+        if size == 0:
+            return False
+        symbol_ids = self.tokenize(symbol_list)
+        if len(self.product_cache) > self.product_cache_limit:
+            self.product_cache.clear()
+        if self.span_cache is not None and len(self.span_cache) > self.span_cache_limit:
+            self.span_cache.clear()
+        parents_by_id = self.parents_by_id
+        table = self.cyk_table
+        for column in range(size):
+            table[column] = parents_by_id[symbol_ids[column]]
+        _fill_table(table, self.cyk_stride, size, self.rule_index, self.right_masks, self.left_mask,
+                    self.right_mask, self.product_cache, symbol_ids, self.span_cache)
+        head = self.get_cell(size-1, 0)
+        return bool(head >> self.symbol_ids[None] & 1)
 
 
     def fits_grammar(self, symbol_list):
@@ -142,22 +475,84 @@ class CYK:
         Returns:
             bool: Whether symbol_list fits PhraseStructure instance's grammar
         """
-        size = len(symbol_list)
-        self.generate_cyk_table(size)
-        for column in range(size):
-            for parent in self.phrase_structure.symbols[symbol_list[column]].get_parents():
-                self.cyk_table[0][column].add(parent)
-        for row in range(1, size):
-            self.fill_cyk_row(row)
-        head = self.cyk_table[-1][0]
-        return None in head
+        return self.fill_cyk_table(symbol_list)
+
+
+    def get_backpointer(self, row, column, parent_id):
+        """
+        get_backpointer
+
+        Finds how a parent produces the span of a cell in the filled
+        cyk table, by looking for a split point and one of the parent's
+        rules whose daughters are set in the cells on either side.
+        Only cells holding the parent's bit should be passed.
+
+        Parameters:
+        - row(int): The row of the cell, at least 1.
+        - column(int): The column of the cell.
+        - parent_id(int): The id of a symbol set in the cell.
+
+        Returns:
+            tuple(int): (split, left_id, right_id), where split is the row
+                        of the left cell, or None if no rule applies.
+        """
+        rules = self.parent_rules[parent_id]
+        for split in range(row):
+            left = self.get_cell(split, column)
+            right = self.get_cell(row-split-1, column+split+1)
+            for left_id, right_id in rules:
+                if left >> left_id & 1 and right >> right_id & 1:
+                    return split, left_id, right_id
+        return None
 
 
     def get_tree(self, symbol_list):
-        size = len(symbol_list)
-        self.generate_cyk_table(size)
-        for column in range(size):
-            for parent in self.phrase_structure.symbols[symbol_list[column]].get_parents():
-                self.cyk_table[0][column].add(parent)
-        for row in range(1, size):
-            
+        """
+        get_tree
+
+        Finds a parse tree for symbol_list. The table is filled as in
+        fits_grammar, then the tree is rebuilt from the root by following
+        get_backpointer, so that no part of the symbol list is parsed
+        twice. When the grammar is ambiguous, one of the trees is returned.
+
+        Parameters:
+        - symbol_list(list(any)): The list of symbols to be evaluated.
+
+        Returns:
+            tuple: None if symbol_list does not fit the grammar. Otherwise
+                   the root node, where each node is a tuple of
+                   (symbol, left_node, right_node), or (symbol, terminal)
+                   for nodes covering a single symbol of symbol_list.
+        """
+        if not self.fill_cyk_table(symbol_list):
+            return None
+
+        # Walk down from the root with an explicit stack, since the tree
+        # can be as deep as symbol_list is long, then build the nodes
+        # bottom-up, children before parents.
+        root = (len(symbol_list)-1, 0, self.symbol_ids[None])
+        children = {}
+        order = []
+        pending = [root]
+        while pending:
+            item = pending.pop()
+            order.append(item)
+            row, column, parent_id = item
+            if row == 0:
+                continue
+            split, left_id, right_id = self.get_backpointer(row, column, parent_id)
+            left = (split, column, left_id)
+            right = (row-split-1, column+split+1, right_id)
+            children[item] = (left, right)
+            pending.append(left)
+            pending.append(right)
+        nodes = {}
+        for item in reversed(order):
+            row, column, parent_id = item
+            parent = self.id_symbols[parent_id]
+            if row == 0:
+                nodes[item] = (parent, symbol_list[column])
+            else:
+                left, right = children[item]
+                nodes[item] = (parent, nodes[left], nodes[right])
+        return nodes[root]
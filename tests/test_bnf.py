@@ -0,0 +1,80 @@
+import unittest
+
+from cfgcyk import BNF, CYK
+
+
+def make_bnf(terminals, intermediates):
+    bnf = BNF()
+    for symbol in terminals:
+        bnf.add_terminal_symbol(symbol)
+        bnf.add_tag(symbol, symbol)
+    for symbol in intermediates:
+        bnf.add_intermediate_symbol(symbol)
+    return bnf
+
+
+class TestBNF(unittest.TestCase):
+    def test_unit_cycle(self):
+        # A -> B -> C -> A used to make conversion_unit loop forever.
+        bnf = make_bnf(["a", "b", "c"], ["A", "B", "C"])
+        bnf.add_rule(0, ("A",))
+        bnf.add_rule("A", ("B",))
+        bnf.add_rule("B", ("C",))
+        bnf.add_rule("C", ("A",))
+        bnf.add_rule("A", ("a",))
+        bnf.add_rule("B", ("b",))
+        bnf.add_rule("C", ("c", "A"))
+        cyk = CYK(bnf.convert_to_cnf())
+        self.assertTrue(bnf.check_if_cnf())
+        self.assertTrue(cyk.fits_grammar(["a"]))
+        self.assertTrue(cyk.fits_grammar(["b"]))
+        self.assertTrue(cyk.fits_grammar(["c", "c", "b"]))
+        self.assertFalse(cyk.fits_grammar(["c"]))
+        self.assertFalse(cyk.fits_grammar(["a", "c"]))
+
+    def test_unit_parents_of_long_rule(self):
+        # The long rule of T used to be split once per unit parent
+        # whenever T came after its parents in self.symbols.
+        def convert(t_first):
+            parents = ["U%d" % i for i in range(20)]
+            intermediates = ["X", "T"] + parents if t_first else ["X"] + parents + ["T"]
+            bnf = make_bnf(["x"], intermediates)
+            bnf.add_rule("X", ("x",))
+            for parent in parents:
+                bnf.add_rule(parent, ("T",))
+                bnf.add_rule(0, (parent, "X"))
+            bnf.add_rule("T", ("X",) * 10)
+            cyk = CYK(bnf.convert_to_cnf())
+            self.assertTrue(bnf.check_if_cnf())
+            self.assertTrue(cyk.fits_grammar(["x"] * 11))
+            self.assertFalse(cyk.fits_grammar(["x"] * 10))
+            return len(bnf.symbols)
+        self.assertEqual(convert(True), convert(False))
+
+    def test_term_mixed_rule(self):
+        # X -> a Y never terminated before TERM rewrote the rule.
+        bnf = make_bnf(["a", "b"], ["X", "Y"])
+        bnf.add_rule(0, ("X",))
+        bnf.add_rule("X", ("a", "Y"))
+        bnf.add_rule("Y", ("b",))
+        cyk = CYK(bnf.convert_to_cnf())
+        self.assertTrue(bnf.check_if_cnf())
+        self.assertTrue(cyk.fits_grammar(["a", "b"]))
+        self.assertFalse(cyk.fits_grammar(["a"]))
+        self.assertFalse(cyk.fits_grammar(["b", "a"]))
+        self.assertFalse(cyk.fits_grammar(["a", "b", "b"]))
+
+    def test_term_all_terminal_rule(self):
+        bnf = make_bnf(["a", "b"], ["X"])
+        bnf.add_rule(0, ("X",))
+        bnf.add_rule("X", ("a", "b"))
+        cyk = CYK(bnf.convert_to_cnf())
+        self.assertTrue(bnf.check_if_cnf())
+        self.assertTrue(cyk.fits_grammar(["a", "b"]))
+        self.assertFalse(cyk.fits_grammar(["a"]))
+        self.assertFalse(cyk.fits_grammar(["b", "a"]))
+        self.assertFalse(cyk.fits_grammar(["a", "b", "a", "b"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import unittest
+
+from cfgcyk import PhraseStructure, CYK
+
+
+def right_branching_grammar():
+    # None -> A None | a, A -> a
+    ps = PhraseStructure()
+    ps.add_symbol("A", is_terminal=False)
+    ps.add_symbol("a", is_terminal=True)
+    ps.add_intermediate_rule(None, "A", None)
+    ps.add_terminal_rule(None, "a")
+    ps.add_terminal_rule("A", "a")
+    return ps
+
+
+def balanced_grammar():
+    # None -> A B | A C, C -> None B, A -> a, B -> b
+    ps = PhraseStructure()
+    for symbol in ("A", "B", "C"):
+        ps.add_symbol(symbol, is_terminal=False)
+    ps.add_symbol("a", is_terminal=True)
+    ps.add_symbol("b", is_terminal=True)
+    ps.add_intermediate_rule(None, "A", "B")
+    ps.add_intermediate_rule(None, "A", "C")
+    ps.add_intermediate_rule("C", None, "B")
+    ps.add_terminal_rule("A", "a")
+    ps.add_terminal_rule("B", "b")
+    return ps
+
+
+def tree_leaves(tree):
+    leaves = []
+    pending = [tree]
+    while pending:
+        node = pending.pop()
+        if len(node) == 2:
+            leaves.append(node[1])
+        else:
+            pending.append(node[2])
+            pending.append(node[1])
+    return leaves
+
+
+class TestCYK(unittest.TestCase):
+    def test_fits_grammar(self):
+        cyk = CYK(right_branching_grammar())
+        self.assertTrue(cyk.fits_grammar(["a"]))
+        self.assertTrue(cyk.fits_grammar(["a", "a", "a"]))
+        self.assertFalse(cyk.fits_grammar([]))
+
+    def test_get_tree(self):
+        cyk = CYK(right_branching_grammar())
+        self.assertEqual(cyk.get_tree(["a", "a"]), (None, ("A", "a"), (None, "a")))
+
+    def test_get_tree_long_right_branching_input(self):
+        symbol_list = ["a"] * 1200
+        cyk = CYK(right_branching_grammar())
+        self.assertTrue(cyk.fits_grammar(symbol_list))
+        tree = cyk.get_tree(symbol_list)
+        self.assertEqual(tree[0], None)
+        self.assertEqual(tree_leaves(tree), symbol_list)
+
+    def test_memoize(self):
+        inputs = ["aabb", "aaabbb", "aab", "abab", "aaaabbbb", "abb", "aaabbb", "aabb"]
+        cyk = CYK(balanced_grammar())
+        memoized = CYK(balanced_grammar(), memoize=True)
+        for symbols in inputs:
+            symbol_list = list(symbols)
+            self.assertEqual(memoized.fits_grammar(symbol_list), cyk.fits_grammar(symbol_list))
+            self.assertEqual(memoized.get_tree(symbol_list), cyk.get_tree(symbol_list))
+        self.assertIn(tuple(memoized.tokenize(list("aabb"))), memoized.span_cache)
+        self.assertTrue(memoized.fits_grammar(list("aaabbb")))
+        self.assertFalse(memoized.fits_grammar(list("aab")))
+
+    def test_product_cache_limit(self):
+        cyk = CYK(right_branching_grammar(), product_cache_limit=0)
+        self.assertTrue(cyk.fits_grammar(["a"] * 5))
+        self.assertGreater(len(cyk.product_cache), 0)
+        self.assertTrue(cyk.fits_grammar(["a"] * 2))
+        self.assertLessEqual(len(cyk.product_cache), 1)
+
+    def test_span_cache_limit(self):
+        cyk = CYK(right_branching_grammar(), memoize=True, span_cache_limit=0)
+        self.assertTrue(cyk.fits_grammar(["a"] * 5))
+        self.assertGreater(len(cyk.span_cache), 0)
+        self.assertTrue(cyk.fits_grammar(["a"] * 2))
+        self.assertLessEqual(len(cyk.span_cache), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()